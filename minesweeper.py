@@ -1,5 +1,8 @@
 import itertools
 import random
+from collections import OrderedDict
+
+import numpy as np
 
 
 class Minesweeper():
@@ -12,23 +15,25 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
-
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        self.board = np.zeros((height, width), dtype=bool)
+
+        # Add mines randomly by drawing distinct cell indices
+        flat = random.sample(range(height * width), mines)
+        self.board.flat[flat] = True
+        self.mines = {divmod(index, width) for index in flat}
+
+        # The board never changes, so count every cell's nearby mines once:
+        # add up the nine shifted copies of a zero-padded board and take
+        # away the cell itself. The counts are kept as plain nested lists,
+        # so that looking up a single cell doesn't go through NumPy scalar
+        # indexing and conversion
+        padded = np.pad(self.board.astype(np.int8), 1)
+        self.counts = (sum(
+            padded[r:r + height, c:c + width]
+            for r in range(3) for c in range(3)
+        ) - self.board).tolist()
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -38,19 +43,18 @@ class Minesweeper():
         Prints a text-based representation
         of where mines are located.
         """
-        for i in range(self.height):
-            print("--" * self.width + "-")
-            for j in range(self.width):
-                if self.board[i][j]:
-                    print("|X", end="")
-                else:
-                    print("| ", end="")
-            print("|")
-        print("--" * self.width + "-")
+        # Build every row as one string and print the board at once
+        line = "--" * self.width + "-"
+        rows = []
+        for row in self.board.tolist():
+            rows.append(line)
+            rows.append("|" + "|".join("X" if mine else " " for mine in row) + "|")
+        rows.append(line)
+        print("\n".join(rows))
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +62,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.counts[i][j]
 
     def won(self):
         """
@@ -84,65 +72,121 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def cell_bit(cell, width):
+    """
+    Returns the bitmask with only the bit for `cell` set.
+    Cell (i, j) maps to bit i * width + j.
+    """
+    i, j = cell
+    return 1 << (i * width + j)
+
+
+def mask_cells(mask, width):
+    """
+    Yields every cell whose bit is set in `mask`.
+    """
+    while mask:
+        # Take the lowest set bit and turn it back into (i, j)
+        low = mask & -mask
+        yield divmod(low.bit_length() - 1, width)
+        mask ^= low
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    The cells are stored as an integer bitmask over the board,
+    so subset and difference checks are plain bitwise operations.
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    def __init__(self, cells, count, width):
+        self.width = width
+        self.cells = 0
+        for cell in cells:
+            self.cells |= cell_bit(cell, width)
         self.count = count
+        # Number of cells, kept up to date as cells are marked
+        self._n = self.cells.bit_count()
+
+    @classmethod
+    def from_mask(cls, mask, count, width):
+        """
+        Creates a sentence straight from a cells bitmask.
+        """
+        sentence = cls((), count, width)
+        sentence.cells = mask
+        sentence._n = mask.bit_count()
+        return sentence
+
+    def signature(self):
+        """
+        Returns the (cells, count) tuple that identifies the sentence.
+        Sentences compare by it. Sentences change as cells are marked,
+        so sets and dicts hold their signatures instead of the sentences.
+        """
+        return (self.cells, self.count)
 
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        return self.signature() == other.signature()
 
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{set(mask_cells(self.cells, self.width))} = {self.count}"
 
     def known_mines(self):
         """
-        Returns the set of all cells in self.cells known to be mines.
+        Returns the bitmask of all cells in self.cells known to be mines.
         """
         # The only time we know that the cells are mines is when the
         # count is the same as the number of cells left
-        # Otherwise return an empty set
-        if len(self.cells) == self.count and self.count != 0:
+        # Otherwise return an empty mask
+        if self._n == self.count and self.count != 0:
             return self.cells
-        return set()
+        return 0
 
     def known_safes(self):
         """
-        Returns the set of all cells in self.cells known to be safe.
+        Returns the bitmask of all cells in self.cells known to be safe.
         """
         # The only time we know that the cells are safe is when the
         # count is 0 (meaning no more mines)
-        # Otherwise return an empty set
+        # Otherwise return an empty mask
         if self.count == 0:
             return self.cells
-        return set()
+        return 0
 
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be a mine.
+        Returns True if the sentence was changed.
         """
         # Knowing that cell is a mine if it appears in self.cells
-        # then remove that cell(mine) from self.cells and update count
-        if cell in self.cells:
-            self.cells.remove(cell)
+        # then clear that cell(mine) from self.cells and update count
+        bit = cell_bit(cell, self.width)
+        if self.cells & bit:
+            self.cells ^= bit
             self.count -= 1
+            self._n -= 1
+            return True
+        return False
 
     def mark_safe(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
+        Returns True if the sentence was changed.
         """
         # Knowing that cell is safe, if it appears in self.cells
-        # then remove that cell(mine) from self.cells
-        if cell in self.cells:
-            self.cells.remove(cell)
+        # then clear that cell(mine) from self.cells
+        bit = cell_bit(cell, self.width)
+        if self.cells & bit:
+            self.cells ^= bit
+            self._n -= 1
+            return True
+        return False
 
 
 class MinesweeperAI():
@@ -163,9 +207,41 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
+        # The same moves made, mines and safes as bitmasks over the
+        # board (bit i * width + j for cell (i, j)), for quick lookups
+        self._moves_bits = 0
+        self._mines_bits = 0
+        self._safes_bits = 0
+
+        # Safe cells that have not been played yet
+        self._safe_frontier = set()
+
+        # The same moves made and mines as flat boolean arrays
+        # over the board, for picking random moves
+        self._played_mask = np.zeros(height * width, dtype=bool)
+        self._mine_mask = np.zeros(height * width, dtype=bool)
+
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # The (cells, count) signature of every sentence in knowledge,
+        # and of every sentence ever inferred over the whole game
+        self._known_sig = set()
+        self._ever_derived = set()
+
+        # The sentences in knowledge that each cell appears in
+        self._cell_to_sentences = {}
+
+        # Sentences that changed and need to be checked again
+        # for new mines or safes, keyed by id() so that a sentence
+        # changed several times is only queued once
+        self._pending = OrderedDict()
+
+        # Sentences with nothing left to conclude on their own,
+        # waiting to be checked against the sentences they are subsets of,
+        # also keyed by id()
+        self._to_infer = OrderedDict()
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
@@ -173,10 +249,16 @@ class MinesweeperAI():
         """
         # Add the cell to the mines set
         self.mines.add(cell)
-        # For every sentence in knowledge update the
+        self._mines_bits |= cell_bit(cell, self.width)
+        self._mine_mask[cell[0] * self.width + cell[1]] = True
+        # For every sentence in knowledge that has the cell update the
         # sentence to mark the new cell(mine) as a mine
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        # and queue it up again if that changed it
+        # No sentence can have the cell after this, so its entry goes
+        for sentence in self._cell_to_sentences.pop(cell, ()):
+            signature = sentence.signature()
+            if sentence.mark_mine(cell):
+                self._changed(sentence, signature)
 
     def mark_safe(self, cell):
         """
@@ -185,10 +267,113 @@ class MinesweeperAI():
         """
         # Add the cell to the safes set
         self.safes.add(cell)
-        # For every sentence in knowledge update the
+        bit = cell_bit(cell, self.width)
+        self._safes_bits |= bit
+        if not self._moves_bits & bit:
+            self._safe_frontier.add(cell)
+        # For every sentence in knowledge that has the cell update the
         # sentence to mark the new cell(safe) as a safe
+        # and queue it up again if that changed it
+        # No sentence can have the cell after this, so its entry goes
+        for sentence in self._cell_to_sentences.pop(cell, ()):
+            signature = sentence.signature()
+            if sentence.mark_safe(cell):
+                self._changed(sentence, signature)
+
+    def _add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and queues it up
+        to be checked for new mines, safes and sentences.
+        """
+        self.knowledge.append(sentence)
+        self._known_sig.add(sentence.signature())
+        for cell in mask_cells(sentence.cells, self.width):
+            self._cell_to_sentences.setdefault(cell, []).append(sentence)
+        self._pending[id(sentence)] = sentence
+
+    def _unindex(self, sentence):
+        """
+        Takes a sentence that is leaving the knowledge base out of
+        the cell index and the queues.
+        Sentences are compared by identity, since another sentence
+        with the same cells and count may be staying.
+        """
+        for cell in mask_cells(sentence.cells, self.width):
+            sentences = self._cell_to_sentences[cell]
+            sentences[:] = [s for s in sentences if s is not sentence]
+        self._pending.pop(id(sentence), None)
+        self._to_infer.pop(id(sentence), None)
+
+    def _changed(self, sentence, signature):
+        """
+        Updates the signatures after a sentence changed from `signature`
+        and queues it up to be checked again.
+        """
+        self._known_sig.discard(signature)
+        self._known_sig.add(sentence.signature())
+        self._pending[id(sentence)] = sentence
+
+    def _infer_from(self, sentence):
+        """
+        Adds the sentences that can be inferred from `sentence` being
+        a subset of other sentences in the knowledge base.
+        """
+        # A superset must have every cell of the sentence, so only the
+        # sentences that have its lowest cell need to be looked at, and
+        # only those with more cells than it can be strict supersets
+        lowest = sentence.cells & -sentence.cells
+        first = divmod(lowest.bit_length() - 1, self.width)
+        size = sentence._n
+        subsumed = []
+        for other in self._cell_to_sentences.get(first, ()):
+            # If sentece is a subset of the other sentence and we have some mines
+            if (other._n > size
+                    and sentence.cells & ~other.cells == 0
+                    and other.count > 0):
+                # Get the difference in sentences to create a new mask(new_sub)
+                new_sub = other.cells & ~sentence.cells
+                new_count = other.count - sentence.count
+                # The sentence and the difference together say
+                # everything the superset did, so the superset can go
+                subsumed.append(other)
+                # If the sentence is not already known and hasn't been
+                # inferred before, create a new sentence using the new
+                # mask(new_sub) and the difference in count and add it
+                # to knowledge. A sentence inferred before and since
+                # dropped was resolved or subsumed, so what it said is
+                # still in the knowledge base
+                signature = (new_sub, new_count)
+                if (signature not in self._known_sig
+                        and signature not in self._ever_derived):
+                    self._ever_derived.add(signature)
+                    self._add_sentence(Sentence.from_mask(
+                        new_sub, new_count, self.width))
+
+        for other in subsumed:
+            self.knowledge = [s for s in self.knowledge if s is not other]
+            self._known_sig.discard(other.signature())
+            self._unindex(other)
+
+    def _prune_knowledge(self):
+        """
+        Drops empty and repeated sentences from the knowledge base
+        and rebuilds the signatures from what is left.
+        Empty sentences are already out of the cell index, since
+        each of their cells was popped from it when it was marked,
+        so they only need taking out of the inference queue.
+        """
+        unique = {}
         for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+            if not sentence.cells:
+                self._to_infer.pop(id(sentence), None)
+                continue
+            signature = sentence.signature()
+            if signature in unique:
+                self._unindex(sentence)
+            else:
+                unique[signature] = sentence
+        self.knowledge = list(unique.values())
+        self._known_sig = set(unique)
 
     def add_knowledge(self, cell, count):
         """
@@ -204,88 +389,124 @@ class MinesweeperAI():
                if it can be concluded based on the AI's knowledge base
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
+
+        Step 5 is put off only when step 4 finds new safe cells on this
+        move and there is a safe move left to make. The sentences waiting
+        for it are then kept, and are worked through on a later move.
+        If no safe move is left, step 5 always runs before returning.
         """
         # 1) Mark the cell as a move that has been made
         self.moves_made.add(cell)
+        self._moves_bits |= cell_bit(cell, self.width)
+        self._played_mask[cell[0] * self.width + cell[1]] = True
+        self._safe_frontier.discard(cell)
         # 2) Mark the cell as safe
         self.mark_safe(cell)
+        # Remember which cells were known safe so we can tell whether
+        # the single point deductions below find any new safes
+        safes_before = self._safes_bits
 
         # 3) Add a new sentence to the AI's knowledge base
         # based on the value of `cell` and `count`
         # Take the location of the cell
-        # and create an empty set for undetermined cells
+        # and create an empty mask for undetermined cells
         i, j = cell
-        new_set = set()
-
-        # For the cell go look at surrounding cells
-        for r in range(i - 1, i + 2):
-            for c in range(j - 1, j + 2):
-                # Create a new cell for current currounding cell
-                # We only want untracked cells so call it u_cell
-                u_cell = (r, c)
-
-                # Continue if u_cell is the original cell
-                # or if the cell is already in safes
-                if cell == u_cell or u_cell in self.safes:
+        new_mask = 0
+
+        # For the cell go look at surrounding cells, clamping the
+        # ranges to the board so edge and corner cells never step
+        # out of bounds
+        for r in range(max(0, i - 1), min(self.height, i + 2)):
+            for c in range(max(0, j - 1), min(self.width, j + 2)):
+                # Bit index of the current surrounding cell
+                index = r * self.width + c
+
+                # Continue if the cell is already in safes
+                # (this includes the original cell)
+                if (self._safes_bits >> index) & 1:
                     continue
 
                 # If already in mines update count
                 # and continue to next cell
-                if u_cell in self.mines:
+                if (self._mines_bits >> index) & 1:
                     count -= 1
                     continue
 
-                # Make sure we don't go out of bounds this is for
-                # the edge and corner cases, if everything checks out
-                # add the set to 'new_set' of undetermined cells
-                if 0 <= r < self.height and 0 <= c < self.width:
-                    new_set.add(u_cell)
-
-        # Create a new sentence using the new_set and the count
-        new_sentence = Sentence(new_set, count)
-        # Add the new sentence to knowledge base
-        self.knowledge.append(new_sentence)
+                # If everything checks out add the cell
+                # to 'new_mask' of undetermined cells
+                new_mask |= 1 << index
+
+        # If the count already settles every undetermined cell, mark them
+        # straight away instead of adding a sentence that would only be
+        # resolved and dropped again. Marking them queues up any other
+        # sentences it changed
+        if count == 0:
+            for u_cell in mask_cells(new_mask, self.width):
+                self.mark_safe(u_cell)
+        elif count == new_mask.bit_count():
+            for u_cell in mask_cells(new_mask, self.width):
+                self.mark_mine(u_cell)
+        else:
+            # Create a new sentence using the new_mask and the count
+            # Add the new sentence to knowledge base, which also queues it
+            # up next to any sentences that marking the cell safe changed
+            self._add_sentence(
+                Sentence.from_mask(new_mask, count, self.width))
 
         # 4) mark any additional cells as safe or as mines
         # if it can be concluded based on the AI's knowledge base
-        # We know that we have just added a new sentence so we have
-        # to go mark any new mines and safe mines in our knowledge base
-        # If we can determine a new mine or a safe mine we have to
-        # update all sentences thay might contain the new mine or safes
-        # This need to look at every sentence because a new mine or safes
-        # will be subtracted from other sentences and we need to see if the
-        # updated sentence will also return a set of mines or safes
-        for sentence in self.knowledge:
-            # If sentence return a non empty set for mines we need to mark them
-            if sentence.known_mines():
-                # For every cell in our returned mine set we need to mark it as a mine
-                for cell in sentence.known_mines().copy():
-                    self.mark_mine(cell)
-            # If sentence return a non empty set for safes we need to mark them
-            if sentence.known_safes():
-                # For every cell in our returned safe set we need to mark it as a safe
-                for cell in sentence.known_safes().copy():
-                    self.mark_safe(cell)
-
         # 5) add any new sentences to the AI's knowledge base
         # if they can be inferred from existing knowledge
-        # Now that we have some knowledge either from the clicked cell or
-        # by the updated marked safes or maked mines from step 4,
-        # we can see if we can create new sentences by seeing if the
-        # new sentence created from the cell clicked is a subset of the other
-        # sentences in out knowledge base. Keep in mind that step 4 might
-        # have changed some sentences so we got to check every sentence
-        for sentence in self.knowledge:
-            # If new sentece is a subset of a sentence and we have some mines
-            if new_sentence.cells.issubset(sentence.cells) and sentence.count > 0 and new_sentence != sentence:
-                # Get the difference in sentences to create a new set(new_sub)
-                new_sub = sentence.cells.difference(new_sentence.cells)
-                # Create a new sentence using the new set(new_sub) and the difference in count
-                current_sentence = Sentence(
-                    list(new_sub), sentence.count - new_sentence.count)
-                # If the newly created sentence is not in knowledge, then add it
-                if current_sentence not in self.knowledge:
-                    self.knowledge.append(current_sentence)
+        # Everything else in the knowledge base was already worked
+        # through on earlier moves, so only the queued sentences need
+        # looking at. Marking a mine or safe queues up the sentences it
+        # actually changed, and inferring a sentence queues up the new
+        # one, so we keep going until nothing new can be concluded
+        # The cheap single point deductions (all safe or all mines) are
+        # always run to the end first. The subset inference is put off only
+        # while they found new safes on this move and a safe move is left,
+        # so the AI never has to guess while queued sentences could still
+        # prove a cell safe. Sentences put off are kept for later moves,
+        # by which point marking cells has often resolved them already
+        while True:
+            while self._pending:
+                _, sentence = self._pending.popitem(last=False)
+                # A sentence can't give both mines and safes, so only ask
+                # for safes when it has no known mines
+                # The masks are plain ints, so they don't need copying before
+                # marking cells changes the sentence
+                mines = sentence.known_mines()
+                if mines:
+                    # For every cell in our returned mine mask we need to mark it as a mine
+                    for cell in mask_cells(mines, self.width):
+                        self.mark_mine(cell)
+                    continue
+                safes = sentence.known_safes()
+                if safes:
+                    # For every cell in our returned safe mask we need to mark it as a safe
+                    for cell in mask_cells(safes, self.width):
+                        self.mark_safe(cell)
+                    continue
+                # Nothing more to conclude from the sentence on its own
+                if sentence.cells:
+                    self._to_infer[id(sentence)] = sentence
+
+            if not self._to_infer or (
+                    self._safe_frontier
+                    and self._safes_bits != safes_before):
+                break
+
+            # See what the sentence says about the sentences it is a
+            # subset of. Sentences leave the queue when they leave the
+            # knowledge base, but one may have been resolved on this move
+            # and not pruned yet
+            _, sentence = self._to_infer.popitem(last=False)
+            if sentence.cells:
+                self._infer_from(sentence)
+
+        # The sentences that were fully resolved have no cells left,
+        # so drop them along with any sentences that have become the same
+        self._prune_knowledge()
 
     def make_safe_move(self):
         """
@@ -296,11 +517,10 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        # Get all available safe moves
-        moves = self.safes - self.moves_made
-        # If the moves result is not empty then choose a random cell
-        if moves:
-            return random.choice(tuple(moves))
+        # The safe frontier holds every safe cell not played yet,
+        # so if it is not empty any cell in it is a safe move
+        if self._safe_frontier:
+            return next(iter(self._safe_frontier))
         return None
 
     def make_random_move(self):
@@ -310,16 +530,11 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        # Create an empty list for available moves
-        moves = []
-        # Go through all the cells in the game board
-        for r in range(self.height):
-            for c in range(self.width):
-                # If the cell has not been played yet and it is not a mine
-                # then we can append it to out available moves list
-                if (r, c) not in self.moves_made and (r, c) not in self.mines:
-                    moves.append((r, c))
+        # The available moves are the cells that have not been
+        # played yet and are not mines
+        moves = np.flatnonzero(~(self._played_mask | self._mine_mask))
         # If there is available moves to be made choose one at random
-        if len(moves) != 0:
-            return random.choice(moves)
+        if moves.size:
+            index = int(moves[random.randrange(moves.size)])
+            return divmod(index, self.width)
         return None